@@ -0,0 +1,20 @@
+
+# ==============================================================================
+# NUMBA JIT DECORATOR (with no-op fallback)
+# ==============================================================================
+# The strategy kernels are decorated with @njit so they compile to native code
+# when numba is installed. If it is not (e.g. a minimal AWS image), the
+# decorator below simply returns the plain Python function so the bot still runs.
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit, supports both @njit and @njit(...)."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+
+        return decorator
@@ -0,0 +1,283 @@
+
+# ==============================================================================
+# STRATEGY KERNEL (JIT-COMPILED PER-BAR LOGIC + VECTORIZED BATCH SIGNALS)
+# ==============================================================================
+# Pure numeric version of the combined TA + Sentiment strategy used by btc_bot.py.
+# Everything here works on plain floats so numba can compile it; btc_bot.py keeps
+# the pandas/logging side and translates the returned codes back to strings.
+
+import numpy as np
+
+from _njit import njit
+
+
+# --- Final action codes (index into ACTION_NAMES) ---
+ACTION_HOLD_DCA_ONLY = 0
+ACTION_MODERATE_BUY = 1
+ACTION_AGGRESSIVE_BUY = 2
+ACTION_AVOID_ENTRY = 3
+ACTION_RISK_BLOCKED_MODERATE_BUY = 4
+ACTION_RISK_BLOCKED_AGGRESSIVE_BUY = 5
+
+ACTION_NAMES = (
+    'HOLD_DCA_ONLY',
+    'MODERATE_BUY',
+    'AGGRESSIVE_BUY',
+    'AVOID_ENTRY',
+    'RISK_BLOCKED_MODERATE_BUY',
+    'RISK_BLOCKED_AGGRESSIVE_BUY',
+)
+
+# --- TA mode codes (also the TA score added to the sentiment score) ---
+TA_NEUTRAL = 0
+TA_RANGE_BOUND = 1
+TA_SWING_TRADE = 2
+
+# --- Trade bit flags returned in trade_mask ---
+TRADE_SWING_SL = 1     # Swing exit via stop-loss
+TRADE_SWING_TP = 2     # Swing exit via take-profit
+TRADE_DCA_BUY = 4
+TRADE_SWING_ENTRY = 8
+
+# --- Rows of the `fills` output array (columns: qty, price, fees) ---
+FILL_SWING_EXIT = 0
+FILL_DCA_BUY = 1
+FILL_SWING_ENTRY = 2
+
+# --- Slots of the `params` array built from the bot configuration ---
+P_DCA_AMOUNT = 0
+P_COMMISSION = 1
+P_ATR_MULT = 2
+P_RSI_OVERSOLD = 3
+P_SWING_MAX = 4
+N_PARAMS = 5
+
+# --- Slots of the portfolio `state` array used by _run_batch ---
+S_CASH = 0
+S_BTC_QTY = 1
+S_SWING_QTY = 2
+S_SWING_ENTRY = 3
+S_STOP_LOSS = 4
+N_STATE = 5
+
+# --- Per-bar portfolio history record filled by _run_batch ---
+HISTORY_DTYPE = np.dtype([
+    ('cash', 'f8'),
+    ('btc_qty', 'f8'),
+    ('equity', 'f8'),
+])
+
+# --- FGI score (integer index 0-100) -> sentiment score lookup table ---
+# Replaces the branch chain: <=24 Extreme Fear (+2), <=49 Fear (+1), >=75 Greed (-1).
+# Fractional scores are rounded toward the neutral 50 (ceil below it, floor above it),
+# which keeps all three edges exact: x <= 49 iff ceil(x) <= 49, x >= 75 iff floor(x) >= 75.
+_FGI_LUT = np.zeros(101, dtype=np.int8)
+_FGI_LUT[:25] = 2
+_FGI_LUT[25:50] = 1
+_FGI_LUT[75:] = -1
+
+
+def _classify(combined_score: int) -> int:
+    """Final action for a combined TA + sentiment score (used to build _ACTION_TABLE)."""
+    if combined_score >= 4:
+        return ACTION_AGGRESSIVE_BUY
+    elif combined_score >= 2:
+        return ACTION_MODERATE_BUY
+    elif combined_score <= -1:
+        return ACTION_AVOID_ENTRY
+    return ACTION_HOLD_DCA_ONLY
+
+
+# --- (TA mode code, sentiment score + 1) -> final action code lookup table ---
+# TA codes are {0, 1, 2} and sentiment scores {-1, 0, 1, 2}, so the ladder above
+# is evaluated for all 12 combinations here and each bar is a single lookup.
+_ACTION_TABLE = np.array(
+    [[_classify(ta_code + sentiment_score) for sentiment_score in range(-1, 3)]
+     for ta_code in (TA_NEUTRAL, TA_RANGE_BOUND, TA_SWING_TRADE)],
+    dtype=np.int8,
+)
+
+# --- Base allocation per action code (0-3), as a fraction of the swing max ---
+_BASE_ALLOCATION = np.zeros(4, dtype=np.float64)
+_BASE_ALLOCATION[ACTION_MODERATE_BUY] = 0.5
+_BASE_ALLOCATION[ACTION_AGGRESSIVE_BUY] = 1.0
+
+
+def make_params(dca_amount: float, commission: float, atr_mult: float,
+                rsi_oversold: float, swing_max: float) -> np.ndarray:
+    """Packs the strategy configuration into the float64 array expected by _execute."""
+    params = np.empty(N_PARAMS, dtype=np.float64)
+    params[P_DCA_AMOUNT] = dca_amount
+    params[P_COMMISSION] = commission
+    params[P_ATR_MULT] = atr_mult
+    params[P_RSI_OVERSOLD] = rsi_oversold
+    params[P_SWING_MAX] = swing_max
+    return params
+
+
+@njit(cache=True)
+def _execute(close, rsi, atr, action_code, allocation_pct,
+             cash, btc_qty, swing_qty, swing_entry, stop_loss,
+             params, fills):
+    """
+    Applies the exit / DCA / entry rules for one bar.
+
+    Returns (cash, btc_qty, swing_qty, swing_entry, stop_loss, trade_mask).
+    Details of each executed trade (qty, price, fees) are written to the
+    matching row of `fills`.
+    """
+    commission_rate = params[P_COMMISSION]
+    trade_mask = 0
+
+    # A. Exits (SL has priority over TP)
+    if swing_qty != 0.0:
+        exit_price = 0.0
+        if close < stop_loss:
+            exit_price = stop_loss
+            trade_mask |= TRADE_SWING_SL
+        elif close >= swing_entry * 1.05:
+            exit_price = close
+            trade_mask |= TRADE_SWING_TP
+
+        if exit_price != 0.0:
+            sale_usd = swing_qty * exit_price
+            commission = sale_usd * commission_rate
+            cash += sale_usd - commission
+            btc_qty -= swing_qty
+            fills[FILL_SWING_EXIT, 0] = swing_qty
+            fills[FILL_SWING_EXIT, 1] = exit_price
+            fills[FILL_SWING_EXIT, 2] = commission
+            swing_qty = 0.0
+            swing_entry = 0.0
+            stop_loss = 0.0
+
+    # B. DCA Buy (conditional size during accumulation periods)
+    dca_amount = params[P_DCA_AMOUNT]
+    if rsi < params[P_RSI_OVERSOLD]:
+        dca_amount *= 1.5
+
+    if cash >= dca_amount:
+        commission = dca_amount * commission_rate
+        buy_qty = (dca_amount - commission) / close
+        cash -= dca_amount
+        btc_qty += buy_qty
+        fills[FILL_DCA_BUY, 0] = buy_qty
+        fills[FILL_DCA_BUY, 1] = close
+        fills[FILL_DCA_BUY, 2] = commission
+        trade_mask |= TRADE_DCA_BUY
+
+    # C. Tactical Entry
+    if action_code != ACTION_HOLD_DCA_ONLY and action_code != ACTION_AVOID_ENTRY \
+            and swing_qty == 0.0 and allocation_pct > 0:
+        trade_budget = cash * allocation_pct
+        if trade_budget > 0:
+            commission = trade_budget * commission_rate
+            buy_qty = (trade_budget - commission) / close
+            cash -= trade_budget
+            btc_qty += buy_qty
+            swing_qty = buy_qty
+            swing_entry = close
+            stop_loss = close - (atr * params[P_ATR_MULT])
+            fills[FILL_SWING_ENTRY, 0] = buy_qty
+            fills[FILL_SWING_ENTRY, 1] = close
+            fills[FILL_SWING_ENTRY, 2] = commission
+            trade_mask |= TRADE_SWING_ENTRY
+
+    return cash, btc_qty, swing_qty, swing_entry, stop_loss, trade_mask
+
+
+## -------------------------------------------------------------- ##
+# BATCH MODE: vectorized signals + one stateful pass
+## -------------------------------------------------------------- ##
+
+def compute_signals(rsi: np.ndarray, macd: np.ndarray, macd_sig: np.ndarray,
+                    fgi: np.ndarray, swing_max: float):
+    """
+    TA/Sentiment decision for every bar at once, over whole columns.
+
+    Returns (action_code, allocation_pct) arrays.
+    """
+    macd_delta = macd - macd_sig
+
+    # 1. TA mode and sentiment scores
+    is_swing = (macd_delta > 0) & (rsi > 55)
+    is_range = (rsi < 50) & (rsi > 30) & (np.abs(macd_delta) < 0.1)
+    ta_code = np.where(is_swing, TA_SWING_TRADE, np.where(is_range, TA_RANGE_BOUND, TA_NEUTRAL))
+
+    fgi = np.nan_to_num(fgi, nan=50.0)
+    fgi_index = np.clip(np.where(fgi < 50, np.ceil(fgi), np.floor(fgi)), 0, 100).astype(np.int64)
+    sentiment_score = _FGI_LUT[fgi_index] # One gather over the whole column
+
+    # 2. Final action and base allocation (two table gathers)
+    action_code = _ACTION_TABLE[ta_code, sentiment_score + 1].astype(np.int64)
+    is_aggressive = action_code == ACTION_AGGRESSIVE_BUY
+    is_buy = is_aggressive | (action_code == ACTION_MODERATE_BUY)
+    base_allocation_pct = swing_max * _BASE_ALLOCATION[action_code]
+
+    # 3. Long-side multiplier: MACD trend (+/-0.2), contrarian FGI extremes (+/-0.3) and
+    #    RSI over-extension (+/-0.1), added in that order and clamped to [0.0, 1.5]
+    multiplier = 1.0 + np.where(macd_delta > 0, 0.2, -0.2)
+    multiplier += np.where(fgi <= 30, 0.3, np.where(fgi >= 70, -0.3, 0.0))
+    multiplier += np.where(rsi >= 75, -0.1, np.where(rsi <= 30, 0.1, 0.0))
+    multiplier = np.clip(multiplier, 0.0, 1.5)
+
+    allocation_pct = np.where(is_buy, np.minimum(base_allocation_pct * multiplier, swing_max), base_allocation_pct)
+
+    blocked = is_buy & (allocation_pct < swing_max * 0.1)
+    action_code = np.where(blocked & is_aggressive, ACTION_RISK_BLOCKED_AGGRESSIVE_BUY,
+                           np.where(blocked, ACTION_RISK_BLOCKED_MODERATE_BUY, action_code))
+
+    return action_code, allocation_pct
+
+
+@njit(cache=True)
+def _run_batch(close, rsi, atr, action_code, allocation_pct, state, params, history):
+    """
+    Walks the bars once, carrying the portfolio state between them.
+
+    `state` holds (cash, btc_qty, swing_qty, swing_entry, stop_loss) and is
+    updated in place. The cash/btc_qty/equity after each bar are written into
+    the preallocated `history` (HISTORY_DTYPE, one record per bar).
+    Returns per-bar (trade_mask, fills).
+    """
+    n = close.shape[0]
+    trade_mask = np.zeros(n, dtype=np.int64)
+    fills = np.zeros((n, 3, 3), dtype=np.float64)
+    hist_cash = history['cash']
+    hist_btc_qty = history['btc_qty']
+    hist_equity = history['equity']
+
+    cash = state[S_CASH]
+    btc_qty = state[S_BTC_QTY]
+    swing_qty = state[S_SWING_QTY]
+    swing_entry = state[S_SWING_ENTRY]
+    stop_loss = state[S_STOP_LOSS]
+
+    for i in range(n):
+        cash, btc_qty, swing_qty, swing_entry, stop_loss, trade_mask[i] = _execute(
+            close[i], rsi[i], atr[i], action_code[i], allocation_pct[i],
+            cash, btc_qty, swing_qty, swing_entry, stop_loss, params, fills[i])
+        hist_cash[i] = cash
+        hist_btc_qty[i] = btc_qty
+        hist_equity[i] = cash + (btc_qty * close[i])
+
+    state[S_CASH] = cash
+    state[S_BTC_QTY] = btc_qty
+    state[S_SWING_QTY] = swing_qty
+    state[S_SWING_ENTRY] = swing_entry
+    state[S_STOP_LOSS] = stop_loss
+
+    return trade_mask, fills
+
+
+def warmup_kernels(params: np.ndarray):
+    """
+    Calls every JIT entry point once on a dummy bar with the same argument types
+    the bot uses, so numba compiles them (or loads them from the cache=True disk
+    cache) at startup instead of during the first trading tick.
+    """
+    one = np.ones(1, dtype=np.float64)
+    action_code, allocation_pct = compute_signals(one * 50.0, one * 0.0, one * 0.0, one * 50.0,
+                                                        params[P_SWING_MAX])
+    _run_batch(one, one * 50.0, one, action_code, allocation_pct, np.zeros(N_STATE, dtype=np.float64),
+               params, np.zeros(1, dtype=HISTORY_DTYPE))
@@ -2,30 +2,62 @@
 # --- SYSTEM AND EMAIL LIBRARIES ---
 import os
 import sys
+import asyncio
+import signal
+import io
+import csv
+import atexit
+import functools
+import string
 import time
+import zlib
+import logging
 import warnings
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Union
+from dataclasses import dataclass
 
 # --- CORE LIBRARIES ---
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq # Parquet cache of the parsed market data
+import polars as pl # Multi-threaded CSV reads and group-bys for the weekly report
 from datetime import datetime, timedelta
+from pathlib import Path
 
 # --- TRADING/TA LIBRARIES ---
 import yfinance as yf
 import pandas_ta
 import requests # For Telegram alerts and general API calls
+from requests.adapters import HTTPAdapter
 
 # --- GOOGLE SHEETS LIBRARIES (Updated for AWS) ---
 import gspread
 from gspread import service_account
-import json
+import orjson # Fast JSON encoder/decoder for the portfolio state file
+
+# --- STRATEGY KERNEL (numba-compiled when available, see _strategy_loop.py) ---
+from _strategy_loop import (
+    _run_batch, compute_signals, make_params, warmup_kernels, ACTION_NAMES,
+    TRADE_SWING_SL, TRADE_SWING_TP, TRADE_DCA_BUY, TRADE_SWING_ENTRY,
+    FILL_SWING_EXIT, FILL_DCA_BUY, FILL_SWING_ENTRY, HISTORY_DTYPE,
+)
 
 warnings.filterwarnings('ignore') # Suppress Pandas/library warnings
 
+# Timestamped log lines: the formatter stamps each record (C-level time.strftime)
+# instead of calling datetime.now().strftime() in every message
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S',
+    stream=sys.stdout,
+)
+logger = logging.getLogger(__name__)
+
 
 # ==============================================================================
 # 1. CONFIGURATION & CREDENTIALS (READ FROM ENVIRONMENT VARIABLES)
@@ -35,15 +67,19 @@ warnings.filterwarnings('ignore') # Suppress Pandas/library warnings
 
 # Local Data Configuration
 CSV_FILE_PATH = 'btc_final_merged_data.csv' 
+MARKET_DATA_CACHE_FILE = 'btc_final_merged_data.parquet' # Parsed copy of CSV_FILE_PATH, reused across restarts
 WORKSHEET_NAME = 'Sheet1'                         # <<< UPDATE THIS: The specific tab/worksheet name
 
 # Bot Execution Parameters
 ##CHECK_INTERVAL_SECONDS = 60 * 5  # Check the market and GSheet data every 5 minutes
 CHECK_INTERVAL_SECONDS = 60 * 60 * 24  # Check the market and GSheet data every 24 hours
+BAR_SETTLE_SECONDS = 60 * 10           # Wake this long after the candle closes, so the data job has written the new bar
+NO_DATA_RECHECK_SECONDS = 60 * 15      # If the new bar is still missing, re-check this often (until the next candle)
 
 # --- NEW: PERSISTENCE FILE PATHS ---
 PORTFOLIO_STATE_FILE = 'portfolio_state.json'
 TRADE_LOG_FILE = 'weekly_trade_log.csv'
+EQUITY_SNAPSHOT_FILE = 'equity_snapshots.csv' # One (timestamp, equity) row per tick for weekly P/L
 
 # --- EMAIL CONFIGURATION (Read from Environment Variables) ---
 EMAIL_SENDER = os.environ.get("GMAIL_USER")
@@ -55,28 +91,116 @@ SMTP_PORT = 587 # Standard port for STARTTLS (encrypted connection)
 # ==============================================================================
 # 2. DATA ACQUISITION FUNCTION (Local CSV)
 # ==============================================================================
-def get_gsheet_data() -> pd.DataFrame:
-    """Reads data from a local CSV file stored on the AWS server."""
-    global CSV_FILE_PATH
+# Explicit dtypes for the kernel columns so the parser does not have to infer them.
+# Close stays float64 for P/L accuracy; the indicators only feed threshold checks
+# and the ATR stop distance, so float32 is plenty and halves their memory.
+_CSV_DTYPES = {
+    'Close': 'float64',
+    'RSI': 'float32', 'MACD': 'float32', 'MACD_Signal': 'float32',
+    'ATR': 'float32', 'FGI_Score': 'float32', # FGI stays float: merged rows may be NaN
+}
+
+
+def _parse_market_data(data: bytes) -> pd.DataFrame:
+    """Parses market data CSV content (header line included)."""
+    # engine='pyarrow' parses with Arrow's multithreaded reader; 'Date' (written as plain
+    # YYYY-MM-DD) is converted inside the parser. Results stay NumPy-backed so 'Date'
+    # becomes a DatetimeIndex and the kernel columns are plain NumPy arrays for to_strategy_arrays.
+    return pd.read_csv(io.BytesIO(data), engine='pyarrow', parse_dates=['Date'],
+                       dtype=_CSV_DTYPES, date_format='%Y-%m-%d')
+
+
+def _read_market_data_incremental(path: str, cache_path: str) -> pd.DataFrame:
+    """
+    Loads the market data CSV through its Parquet cache. The cache records the size and CRC32 of the
+    CSV bytes it was built from. If the CSV is unchanged, the rows come straight from the
+    Parquet file. If rows were only appended, just the new tail is parsed and added.
+    Any other change (e.g. the file was regenerated) triggers a full re-parse.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    cached_df, cached_size, cached_crc = None, -1, None
+    try:
+        meta = pq.read_schema(cache_path).metadata or {}
+        cached_size = int(meta[b'source_size'])
+        cached_crc = int(meta[b'source_crc32'])
+    except (OSError, KeyError, ValueError, pa.ArrowException):
+        pass # No usable cache yet
+
+    # The cached part must still be a prefix of the file and end on a row boundary
+    prefix_ok = 0 < cached_size <= len(raw) and raw[cached_size - 1:cached_size] == b'\n'
+    prefix_crc = zlib.crc32(raw[:cached_size]) if prefix_ok else None
+    if prefix_crc is not None and prefix_crc == cached_crc:
+        cached_df = pq.read_table(cache_path, memory_map=True).to_pandas()
+        if cached_size == len(raw):
+            return cached_df
+
+        # Appended rows only: parse the header line + the new tail
+        header = raw[:raw.index(b'\n') + 1]
+        new_rows = _parse_market_data(header + raw[cached_size:])
+        df = pd.concat([cached_df, new_rows], ignore_index=True)
+    else:
+        df = _parse_market_data(raw)
 
     try:
-        # Use a standard Pandas read_csv call for local file access
-        df = pd.read_csv(CSV_FILE_PATH)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'source_size': str(len(raw)).encode(),
+            b'source_crc32': str(zlib.crc32(raw)).encode(),
+        })
+        pq.write_table(table, cache_path)
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("⚠️ WARNING: Failed to update the market data cache: %s", e)
+
+    return df
 
-        # REQUIRED: Convert your Date/Time column to actual datetime objects and set index
-        # NOTE: If your column is named 'timestamp' or 'date', update 'Date' below
-        df['Date'] = pd.to_datetime(df['Date'])
+
+@functools.lru_cache(maxsize=1)
+def _read_market_data_cached(mtime: float) -> pd.DataFrame:
+    """
+    Loads CSV_FILE_PATH once per modification time. An unchanged file is served from
+    memory; a new mtime misses the cache and parses only the appended rows (see
+    _read_market_data_incremental). The returned DataFrame is shared between calls,
+    so treat it as read-only.
+    """
+    return _read_market_data_incremental(CSV_FILE_PATH, MARKET_DATA_CACHE_FILE)
+
+
+# Errors a later cycle can recover from (file I/O, network, malformed data). The main loop
+# retries these with exponential backoff; anything else is a bug and stops the bot.
+TRANSIENT_ERRORS = (
+    OSError, requests.RequestException, gspread.exceptions.APIError,
+    pd.errors.EmptyDataError, pd.errors.ParserError, pa.ArrowException,
+)
+
+
+def get_gsheet_data() -> pd.DataFrame:
+    """
+    Reads data from a local CSV file stored on the AWS server.
+    A missing, unreadable or truncated file raises (one of TRANSIENT_ERRORS), so
+    run_bot retries it with backoff instead of waiting for the next candle.
+    """
+
+    try:
+        # Cached Pandas read_csv call for local file access (re-parsed only when the file changes)
+        # REQUIRED: Your Date/Time column is parsed to datetime objects and set as index
+        # NOTE: If your column is named 'timestamp' or 'date', update 'Date' in _parse_market_data
+        df = _read_market_data_cached(os.path.getmtime(CSV_FILE_PATH))
         df = df.set_index('Date')
 
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Data loaded from local CSV. Rows: {len(df)}")
+        logger.info("✅ Data loaded from local CSV. Rows: %d", len(df))
         return df
 
     except FileNotFoundError:
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ FATAL Error: Local CSV file '{CSV_FILE_PATH}' not found. Waiting...")
-        return pd.DataFrame()
+        logger.error("❌ FATAL Error: Local CSV file '%s' not found.", CSV_FILE_PATH)
+        raise
+    except TRANSIENT_ERRORS:
+        raise # Logged (and retried) by run_bot
     except Exception as e:
         # If the file is found but structured wrong
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ FATAL Error reading CSV data: {e}")
+        logger.error("❌ FATAL Error reading CSV data: %s", e)
         return pd.DataFrame()
 
 ## -------------------------------------------------------- ##
@@ -99,376 +223,412 @@ RSI_OVERBOUGHT_THRESHOLD = 70 # Threshold for potential "Swing" profit-taking
 SWING_TRADE_ALLOCATION_MAX = 0.60 # Max percentage of budget for active trades
 
 
-## ---------------------------------------------------------------- ##
-# SIMPLIFIED RULE-BASED ADAPTIVE MULTIPLIER
-# --- Focuses only on MACD Trend and FGI Extremes ---
-## ---------------------------------------------------------------- ##
-
-def get_rule_based_multiplier(current_data: pd.Series, combined_action: str) -> float:
-    """
-    Generates a simplified contextual risk multiplier (0.0 to 1.5) by checking
-    if MACD trend and FGI extremes confirm the combined trading action.
-    """
-
-    rsi = current_data['RSI']
-    macd_delta = current_data['MACD'] - current_data['MACD_Signal']
-    fgi_score = current_data['FGI_Score']
-
-    # Base Multiplier: Neutral starting point
-    multiplier = 1.0
-
-    # Check if the core action is a BUY/LONG
-    is_long_action = 'BUY' in combined_action.upper() or 'LONG' in combined_action.upper()
-
-    # If the strategy is FLAT, exit immediately
-    if 'FLAT' in combined_action.upper() or 'HOLD' in combined_action.upper():
-        return 1.0
-
-    # --- 1. MACD Trend Confirmation (Adds/Subtracts 0.2) ---
-    # The MACD delta should align with the trade direction.
-    if (is_long_action and macd_delta > 0) or (not is_long_action and macd_delta < 0):
-        # Trend Confirms Action
-        multiplier += 0.2
-    else:
-        # Trend Contradicts Action (Trading against momentum is riskier)
-        multiplier -= 0.2
-
-    # --- 2. FGI Extreme Sentiment (Adds/Subtracts 0.3) ---
-    # We look for contrarian signals (Fear for Buys, Greed for Sells)
-    if fgi_score <= 30: # Extreme Fear (Contrarian Buy Signal)
-        multiplier += (0.3 if is_long_action else -0.3)
-    elif fgi_score >= 70: # Extreme Greed (Contrarian Sell Signal)
-        multiplier += (-0.3 if is_long_action else 0.3)
-
-    # --- 3. RSI Over-extension Filter (Adds/Subtracts 0.1) ---
-    # Punish the trade if momentum is exhausted (RSI is too high for a Buy, too low for a Sell)
-    if (is_long_action and rsi >= 75) or (not is_long_action and rsi <= 25):
-        multiplier -= 0.1
-    elif (is_long_action and rsi <= 30) or (not is_long_action and rsi >= 70):
-        multiplier += 0.1 # Reward entering at oversold/overbought extremes
-
-    # 4. Clamp the output to ensure it stays within the required range
-    final_multiplier = max(0.0, min(1.5, multiplier))
-
-    return final_multiplier
 
-# Assign the rule-based function to the name expected by Block 4
-get_final_multiplier = get_rule_based_multiplier
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Read-only bot settings, built once from the parameters above."""
+    starting_budget: float
+    commission: float
+    dca_amount: float
+    atr_mult: float
+    rsi_oversold: int
+    rsi_overbought: int
+    swing_max: float
+    check_interval_seconds: int
+    bar_settle_seconds: int
+    no_data_recheck_seconds: int
+
+
+# Functions receive this as a `cfg=CFG` default argument, so each setting is a
+# local attribute read instead of a module-global lookup
+CFG = Config(
+    starting_budget=STARTING_BUDGET,
+    commission=COMMISSION_RATE,
+    dca_amount=DCA_AMOUNT_DAILY,
+    atr_mult=ATR_MULTIPLIER,
+    rsi_oversold=RSI_OVERSOLD_THRESHOLD,
+    rsi_overbought=RSI_OVERBOUGHT_THRESHOLD,
+    swing_max=SWING_TRADE_ALLOCATION_MAX,
+    check_interval_seconds=CHECK_INTERVAL_SECONDS,
+    bar_settle_seconds=BAR_SETTLE_SECONDS,
+    no_data_recheck_seconds=NO_DATA_RECHECK_SECONDS,
+)
+
+# Parameters packed for the JIT strategy kernel (order defined in _strategy_loop.py)
+STRATEGY_PARAMS = make_params(CFG.dca_amount, CFG.commission, CFG.atr_mult, CFG.rsi_oversold, CFG.swing_max)
+
+# Columns fed to the kernel, in the order run_strategy_batch unpacks them
+KERNEL_COLUMNS = ['Close', 'RSI', 'MACD', 'MACD_Signal', 'FGI_Score', 'ATR']
+# Columns the data file must provide for the strategy to run
+REQUIRED_COLS = frozenset(KERNEL_COLUMNS)
 
 
 ## -------------------------------------------------------------- ##
 # -----    DATA PERSISTENCE UTILITIES (REQUIRED FOR WEEKLY REPORT) -----
 ## -------------------------------------------------------------- ##
-def save_portfolio_state(portfolio: dict): 
-    """Saves the current state of the portfolio to a JSON file."""
-    global PORTFOLIO_STATE_FILE
+def save_portfolio_state(portfolio: 'Portfolio', durable: bool = False): 
+    """
+    Saves the current state of the portfolio to a JSON file (atomic replace).
+    With durable=True the data is fsync'ed before the replace; run_bot asks for
+    that once per batch, on the single end-of-batch write.
+
+    The payload is only the fixed Portfolio fields (a few hundred bytes); per-bar
+    history is streamed to the trade log / equity curve CSVs instead, so the state
+    file never grows with the run. It is rewritten whole on purpose: an in-place
+    write into a mapped file could be torn by a crash, the replace cannot.
+    """
     try:
-        with open(PORTFOLIO_STATE_FILE, 'w') as f:
-             # <--- UPDATE: Convert date objects to string before saving 
-            if isinstance(portfolio.get('last_report_date'), datetime): 
-                portfolio['last_report_date'] = portfolio['last_report_date'].strftime('%Y-%m-%d %H:%M:%S') 
-
-            # <--- NEW: Convert processed date to string 
-            if isinstance(portfolio.get('last_processed_date'), datetime): 
-                portfolio['last_processed_date'] = portfolio['last_processed_date'].strftime('%Y-%m-%d %H:%M:%S')
-
-            json.dump(portfolio, f, indent=4)
+        # orjson serializes the dataclass fields directly and writes datetimes as ISO
+        # strings (default=str covers pd.Timestamp), so the in-memory dates stay datetimes
+        data = orjson.dumps(portfolio, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+
+        # Write to a temp file first so a crash never leaves a half-written state file
+        tmp_path = PORTFOLIO_STATE_FILE + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, PORTFOLIO_STATE_FILE)
     except Exception as e:
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ WARNING: Failed to save portfolio state: {e}")
-
-
-def log_trade_event(date: datetime, action: str, trade_type: str, qty: float, price: float, fees: float):
-    """Appends a new trade record to the trade log CSV."""
-    global TRADE_LOG_FILE
+        logger.warning("⚠️ WARNING: Failed to save portfolio state: %s", e)
+
+
+# Portfolio entries written as ISO date strings and parsed back to datetimes on startup
+PORTFOLIO_DATE_KEYS = ('last_report_date', 'last_processed_date')
+
+# Sentinel for a fresh portfolio that has not processed any bar yet (history start date)
+INITIAL_PROCESSED_DATE = datetime(2023, 1, 1)
+
+
+@dataclass(slots=True)
+class Portfolio:
+    """Live portfolio state, persisted to PORTFOLIO_STATE_FILE by save_portfolio_state."""
+    cash: float = STARTING_BUDGET
+    btc_qty: float = 0.0
+    swing_qty: float = 0.0
+    swing_entry_price: float = 0.0
+    stop_loss_level: float = 0.0
+    total_value_usd: float = STARTING_BUDGET
+    prev_week_equity: float = STARTING_BUDGET # Initial value for P/L baseline
+    last_report_date: Optional[datetime] = None
+    last_processed_date: datetime = INITIAL_PROCESSED_DATE # Tracks the last day we traded
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'Portfolio':
+        """Builds a Portfolio from a decoded state file: unknown keys are ignored, ISO dates parsed."""
+        fields = {key: value for key, value in state.items() if key in cls.__dataclass_fields__}
+        for key in PORTFOLIO_DATE_KEYS:
+            if isinstance(fields.get(key), str):
+                fields[key] = datetime.fromisoformat(fields[key])
+        return cls(**fields)
+
+
+# Trade records and equity snapshots are buffered in memory and written with a
+# single bulk append per tick (see _flush_trades / _flush_equity_snapshots)
+# instead of one DataFrame + to_csv per record.
+TRADE_LOG_COLUMNS = ('Date', 'Action', 'Trade_Type', 'Quantity', 'Price', 'Fees')
+# Fixed Trade_Type vocabulary, so the report can count with set lookups instead of regex
+SWING_TRADE_TYPES = ('Swing', 'SwingSL', 'SwingTP')
+TRADE_TYPES = ('DCA',) + SWING_TRADE_TYPES
+# The trade-log columns the weekly report reads, with their types (the rest are not parsed)
+TRADE_LOG_SCHEMA = {'Date': pl.String, 'Trade_Type': pl.Categorical, 'Fees': pl.Float64}
+EQUITY_SNAPSHOT_COLUMNS = ('Timestamp', 'Equity')
+_TRADE_BUFFER: list = []
+_EQUITY_BUFFER: list = []
+
+
+def _has_content(path: str) -> bool:
+    """True if the file exists and is non-empty (a single stat call)."""
     try:
-        # Create a new record dictionary
-        record = {
-            'Date': date.strftime('%Y-%m-%d %H:%M:%S'),
-            'Action': action,  # e.g., 'BUY' or 'SELL'
-            'Trade_Type': trade_type,  # e.g., 'DCA', 'Swing', 'LLM'
-            'Quantity': qty,
-            'Price': price,
-            'Fees': fees
-        }
-        
-        # Determine if we need to write the header (check if file exists/is empty)
-        file_exists = os.path.exists(TRADE_LOG_FILE) and os.path.getsize(TRADE_LOG_FILE) > 0
-        
-        # Convert record to a DataFrame for easy appending
-        new_df = pd.DataFrame([record])
-        
-        # Append the data to the CSV
-        new_df.to_csv(
-            TRADE_LOG_FILE, 
-            mode='a', 
-            header=not file_exists, # Write header only if the file is new/does not exist
-            index=False
-        )
-    except Exception as e:
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ WARNING: Failed to log trade event: {e}")
-
-
-## -------------------------------------------------------------- ##
-# ----- Dynamic Trading Strategy: CORE EXECUTION FUNCTIONS (MODIFIES PORTFOLIO) -----
-## -------------------------------------------------------------- ##
-
-
-def execute_dca_buy(row, portfolio: dict) -> bool:
-    """Executes a daily DCA buy and modifies the portfolio state."""
-    global DCA_AMOUNT_DAILY, COMMISSION_RATE, RSI_OVERSOLD_THRESHOLD
-
-    current_close = row['Close']
-    dca_amount = DCA_AMOUNT_DAILY
-
-    # Conditional DCA: Increase buy size during accumulation periods
-    if row['RSI'] < RSI_OVERSOLD_THRESHOLD:
-        dca_amount *= 1.5
-
-    if portfolio['cash'] >= dca_amount:
-        commission = dca_amount * COMMISSION_RATE
-        buy_qty = (dca_amount - commission) / current_close
-
-        # Update portfolio directly
-        portfolio['cash'] -= dca_amount
-        portfolio['btc_qty'] += buy_qty
-       
-       #  -- LOG TRADE --
-        log_trade_event(row.name, 'BUY', 'DCA', buy_qty, current_close, commission)
-        
-        return True
-    return False
+        return os.stat(path).st_size > 0
+    except OSError:
+        return False
 
 
-def open_tactical_trade(row, portfolio: dict, allocation_pct: float) -> bool:
-    """Opens a tactical position and modifies the portfolio state."""
-    global ATR_MULTIPLIER, COMMISSION_RATE
+# Whether each CSV already has its header, checked once at import instead of on every flush
+_TRADE_LOG_HEADER_WRITTEN = _has_content(TRADE_LOG_FILE)
+_EQUITY_HEADER_WRITTEN = _has_content(EQUITY_SNAPSHOT_FILE)
 
-    if portfolio.get('swing_qty', 0.0) > 0:
-        return False
 
-    trade_budget = portfolio['cash'] * allocation_pct
+def _append_csv_rows(path: str, columns: tuple, rows: list, header_written: bool):
+    """Appends rows to a CSV in one write, adding the header first unless it is already there."""
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if not header_written:
+            writer.writerow(columns)
+        writer.writerows(rows)
 
-    if trade_budget > 0:
-        entry_price = row['Close']
-        commission = trade_budget * COMMISSION_RATE
-        buy_qty = (trade_budget - commission) / entry_price
 
-        # ATR Stop Loss Calculation
-        stop_loss_level = entry_price - (row['ATR'] * ATR_MULTIPLIER)
+def log_trade_event(date: datetime, action: str, trade_type: str, qty: float, price: float, fees: float):
+    """Queues a new trade record for the trade log CSV (written by _flush_trades)."""
+    if trade_type not in TRADE_TYPES:
+        raise ValueError(f"Unknown trade type '{trade_type}'. Expected one of {TRADE_TYPES}.")
 
-        # Update portfolio directly
-        portfolio['cash'] -= trade_budget
-        portfolio['btc_qty'] += buy_qty
-        portfolio['swing_qty'] = buy_qty
-        portfolio['swing_entry_price'] = entry_price
-        portfolio['stop_loss_level'] = stop_loss_level
-        
-        # ----- LOG TRADE ---
-        log_trade_event(row.name, 'BUY', 'Swing', buy_qty, entry_price, commission)
+    _TRADE_BUFFER.append((
+        date.strftime('%Y-%m-%d %H:%M:%S'),
+        action,  # e.g., 'BUY' or 'SELL'
+        trade_type,  # One of TRADE_TYPES: 'DCA', 'Swing', 'SwingSL', 'SwingTP'
+        float(qty),
+        float(price),
+        float(fees),
+    ))
 
-        return True
-    return False
 
+def log_equity_snapshot(timestamp: datetime, equity: float):
+    """Queues a (timestamp, total_value_usd) point for the weekly P/L baseline."""
+    _EQUITY_BUFFER.append((timestamp.strftime('%Y-%m-%d %H:%M:%S'), float(equity)))
 
-def close_tactical_trade(row, portfolio: dict, final_action: str) -> bool:
-    """Determines and executes the parameters for closing the tactical trade (SL or TP)."""
-    global COMMISSION_RATE
 
-    if portfolio.get('swing_qty', 0.0) == 0.0:
-        return False
-
-    btc_to_sell = portfolio['swing_qty']
-    current_close = row['Close']
-    entry_price = portfolio['swing_entry_price']
+def _flush_trades():
+    """Appends all buffered trade records to the trade log CSV in one write."""
+    global _TRADE_LOG_HEADER_WRITTEN
+    if not _TRADE_BUFFER:
+        return
+    try:
+        _append_csv_rows(TRADE_LOG_FILE, TRADE_LOG_COLUMNS, _TRADE_BUFFER, _TRADE_LOG_HEADER_WRITTEN)
+        _TRADE_LOG_HEADER_WRITTEN = True
+        _TRADE_BUFFER.clear()
+    except Exception as e:
+        logger.warning("⚠️ WARNING: Failed to log trade event: %s", e)
 
-    exit_price = 0.0
-    exit_type = '' # Initialize exit_type for logging
 
-    # Condition 1: STOP-LOSS CHECK (Risk Management Override)
-    if current_close < portfolio['stop_loss_level']:
-        exit_price = portfolio['stop_loss_level']
-        exit_type = 'SwingSL' # Set log type for Stop-Loss
+def _flush_equity_snapshots():
+    """Appends all buffered equity snapshots to the snapshot CSV in one write."""
+    global _EQUITY_HEADER_WRITTEN
+    if not _EQUITY_BUFFER:
+        return
+    try:
+        _append_csv_rows(EQUITY_SNAPSHOT_FILE, EQUITY_SNAPSHOT_COLUMNS, _EQUITY_BUFFER, _EQUITY_HEADER_WRITTEN)
+        _EQUITY_HEADER_WRITTEN = True
+        _EQUITY_BUFFER.clear()
+    except Exception as e:
+        logger.warning("⚠️ WARNING: Failed to save equity snapshot: %s", e)
 
-    # Condition 2: PROFIT-TAKE CHECK (Strategy Driven)
-    elif current_close >= entry_price * 1.05:
-      exit_price = current_close
-      exit_type = 'SwingTP' # Set log type for Take-Profit
 
-    else:
-        return False # No exit condition met
+def _read_csv_rows_since(path: str, since: datetime, block_size: int = 64 * 1024) -> bytes:
+    """
+    Reads a timestamp-first CSV (trade log, equity snapshots) backwards from EOF in
+    `block_size` blocks and stops at the first block whose first complete row is
+    dated before `since`. Rows are appended in time order, so everything earlier is
+    older too and is never read: the cost is O(rows in the window), not O(history).
+    Returns the data rows (no header) as bytes. A few rows before `since` are
+    included when the file has them, the caller still filters.
+    """
+    # 'YYYY-MM-DD HH:MM:SS' sorts like the timestamp, so raw bytes can be compared
+    cutoff = since.strftime('%Y-%m-%d %H:%M:%S').encode()
 
-    # Execute Sale
-    sale_usd = btc_to_sell * exit_price
-    commission = sale_usd * COMMISSION_RATE
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
 
-    # Update portfolio directly
-    portfolio['cash'] += sale_usd - commission
-    portfolio['btc_qty'] -= btc_to_sell
+            # parts[0] is a row cut by the seek (or the header at BOF), parts[1] the first full row
+            parts = tail.split(b'\n', 2)
+            if len(parts) > 2 and parts[1][:len(cutoff)] < cutoff:
+                break
 
-    # ----- LOG TRADE (ADDED LOGIC) ---
-    log_trade_event(row.name, 'SELL', exit_type, btc_to_sell, exit_price, commission)
+    # Drop the first line: either the header or a row cut in half by the seek
+    _, _, rows = tail.partition(b'\n')
+    return rows
 
-    # Reset swing trade variables
-    portfolio['swing_qty'] = 0.0
-    portfolio['swing_entry_price'] = 0.0
-    portfolio['stop_loss_level'] = 0.0
 
-    return True
+# Make sure buffered records reach disk even if the process exits mid-tick
+atexit.register(_flush_trades)
+atexit.register(_flush_equity_snapshots)
 
 
 ## -------------------------------------------------------------- ##
 # COMBINED STRATEGY (MASTER DECIDER AND EXECUTOR)
-# --- Updated: Removed dependency on 'decide_strategy' and integrated TA logic ---
+# --- TA/Sentiment scoring and the multiplier are vectorized (compute_signals),
+# --- DCA/Swing execution runs in the JIT kernel `_run_batch` (see _strategy_loop.py);
+# --- run_strategy_batch syncs the Portfolio and logs the resulting trades.
 ## -------------------------------------------------------------- ##
 
 
-def get_combined_signal_and_execute(current_data: pd.Series, portfolio: dict) -> dict:
+def to_strategy_arrays(df: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
     """
-    Combines TA (in-line) and Sentiment, applies the Adaptive Multiplier,
-    makes the final decision, and executes the trade by modifying the portfolio.
+    Builds the column layout used by the strategy: one contiguous float64 array
+    per kernel column plus the bar timestamps, so each bar is read as arrays['X'][i].
+    Arrays are always writeable: pandas may hand out read-only views (copy-on-write),
+    which numba treats as a different type and would compile the kernels again for.
     """
-    global SWING_TRADE_ALLOCATION_MAX
-
-    # --- 1. BASE DECISION LOGIC (TA and Sentiment Score Calculation) ---
-    # 1.1 Calculate TA Mode In-Line (REPLACEMENT FOR decide_strategy)
-    rsi = current_data['RSI']
-    macd_delta = current_data['MACD'] - current_data['MACD_Signal']
-
-    if macd_delta > 0 and rsi > 55:
-        # Strong Momentum, suggests swinging
-        ta_mode = 'SWING_TRADE'
-    elif rsi < 50 and rsi > 30 and abs(macd_delta) < 0.1:
-        # Low momentum, likely consolidation/range
-        ta_mode = 'RANGE_BOUND'
-    else:
-        ta_mode = 'NEUTRAL'
-
-    # 1.2 Calculate Scores
-    fgi_score = current_data['FGI_Score']
-
-    sentiment_score = 0
-    if fgi_score <= 24: sentiment_score = 2
-    elif fgi_score <= 49: sentiment_score = 1
-    elif fgi_score >= 75: sentiment_score = -1
-
-    ta_score = 0
-    if ta_mode == 'SWING_TRADE': ta_score = 2
-    elif ta_mode == 'RANGE_BOUND': ta_score = 1
-    # NEUTRAL ta_mode implicitly gives ta_score = 0
-
-    combined_score = ta_score + sentiment_score
-
-    # 1.3 Determine Final Action and Base Allocation
-    if combined_score >= 4:
-        final_action = "AGGRESSIVE_BUY"
-        base_allocation_pct = SWING_TRADE_ALLOCATION_MAX # Base 100% of max
-    elif combined_score >= 2:
-        final_action = "MODERATE_BUY"
-        base_allocation_pct = SWING_TRADE_ALLOCATION_MAX * 0.5 # Base 50% of max
-    elif combined_score <= -1:
-        final_action = "AVOID_ENTRY"
-        base_allocation_pct = 0.0
-    else:
-        final_action = "HOLD_DCA_ONLY"
-        base_allocation_pct = 0.0
+    arrays = {col: np.require(df[col].to_numpy(dtype=np.float64), requirements=['C', 'W'])
+              for col in KERNEL_COLUMNS}
+    index_ts = df.index.values.astype('datetime64[s]')
+    return arrays, index_ts
 
-    # --- 2. MULTIPLIER CALCULATION AND APPLICATION ---
 
-    # Only calculate and apply the multiplier if there is a potential BUY action
-    if 'BUY' in final_action:
-        # Get the adaptive risk multiplier from the stable rule-based function
-        risk_multiplier = get_final_multiplier(current_data, final_action)
+def log_executed_trades(trade_date: datetime, trade_mask: int, fills: np.ndarray) -> list:
+    """Translates a kernel trade mask back to trade names and logs each fill."""
+    executed_trades = [] # <---  TRACK ALL TRADES ON THIS DAY
 
-        # Apply the multiplier to the base trade size
-        allocation_pct = base_allocation_pct * risk_multiplier
+    if trade_mask & (TRADE_SWING_SL | TRADE_SWING_TP):
+        exit_type = 'SwingSL' if trade_mask & TRADE_SWING_SL else 'SwingTP'
+        log_trade_event(trade_date, 'SELL', exit_type, *fills[FILL_SWING_EXIT])
+        executed_trades.append("SWING EXIT")
 
-        # Final safety clamp: Ensure we don't exceed the global max allocation
-        allocation_pct = min(allocation_pct, SWING_TRADE_ALLOCATION_MAX)
+    if trade_mask & TRADE_DCA_BUY:
+        log_trade_event(trade_date, 'BUY', 'DCA', *fills[FILL_DCA_BUY])
+        executed_trades.append("DCA BUY")
 
-        # If the multiplier drops the trade size too low, update the action description
-        if allocation_pct < SWING_TRADE_ALLOCATION_MAX * 0.1:
-             final_action = f"RISK_BLOCKED_{final_action}"
-    else:
-        allocation_pct = base_allocation_pct
-        risk_multiplier = 1.0 # For reporting purposes
+    if trade_mask & TRADE_SWING_ENTRY:
+        log_trade_event(trade_date, 'BUY', 'Swing', *fills[FILL_SWING_ENTRY])
+        executed_trades.append("SWING ENTRY")
 
-    # --- 3. EXECUTION LOGIC ---
-    executed_trades = [] # <---  TRACK ALL TRADES ON THIS DAY
+    return executed_trades
 
-    # Use a variable for the action string to pass to execution functions
-    current_final_action = final_action
 
-    # A. Execute Exits (Must check this first)
-    if close_tactical_trade(current_data, portfolio, current_final_action):
-        executed_trades.append("SWING EXIT")
+# Preallocated per-bar history (ts, cash, btc_qty, equity) reused by every batch;
+# it only grows (doubling) when a batch is longer than any seen before
+_HISTORY = np.zeros(1024, dtype=HISTORY_DTYPE)
 
-    # B. Execute DCA Buy (Usually runs regardless of tactical signal)
-    if execute_dca_buy(current_data, portfolio):
-        executed_trades.append("DCA BUY")
 
-    # C. Execute TACTICAL Entry (Driven by the final_action and calculated allocation_pct)
-    if 'BUY' in current_final_action and portfolio['swing_qty'] == 0.0 and allocation_pct > 0:
-        if open_tactical_trade(current_data, portfolio, allocation_pct):
-            executed_trades.append("SWING ENTRY")
+def _history_buffer(n: int) -> np.ndarray:
+    """Returns a view of the first `n` records of the shared history buffer."""
+    global _HISTORY
+    if n > len(_HISTORY):
+        _HISTORY = np.zeros(max(n, 2 * len(_HISTORY)), dtype=HISTORY_DTYPE)
+    return _HISTORY[:n]
+
+
+def run_strategy_batch(arrays: Dict[str, np.ndarray], index_ts: np.ndarray, portfolio: Portfolio,
+                       cfg: Config = CFG, params: np.ndarray = STRATEGY_PARAMS) -> dict:
+    """
+    Combines TA and Sentiment, applies the Adaptive Multiplier and executes the
+    trades: computes the signals for all bars at once with NumPy, then walks the
+    bars a single time in the JIT kernel to apply the stateful DCA/Swing trades.
+    The returned 'history' is a view of the shared buffer, valid until the next batch.
+    """
+    close, rsi, macd, macd_sig, fgi_score, atr = (arrays[col] for col in KERNEL_COLUMNS)
+
+    # 1. Vectorized TA/Sentiment decision for every bar
+    action_code, allocation_pct = compute_signals(
+        rsi, macd, macd_sig, fgi_score, cfg.swing_max
+    )
+
+    # 2. One stateful pass (exits, DCA, entries)
+    state = np.array([
+        portfolio.cash, portfolio.btc_qty, portfolio.swing_qty,
+        portfolio.swing_entry_price, portfolio.stop_loss_level,
+    ], dtype=np.float64)
+    history = _history_buffer(len(index_ts))
+    trade_mask, fills = _run_batch(
+        close, rsi, atr, action_code, allocation_pct, state, params, history
+    )
+    # The kernel kept the state in locals for the whole pass; sync it back once
+    (portfolio.cash, portfolio.btc_qty, portfolio.swing_qty,
+     portfolio.swing_entry_price, portfolio.stop_loss_level) = state.tolist()
+    portfolio.total_value_usd = history['equity'][-1].item()
+
+    # 3. Log the trades (only bars where something was executed)
+    executed_trades = [[] for _ in range(len(index_ts))]
+    for i in np.flatnonzero(trade_mask):
+        executed_trades[i] = log_executed_trades(index_ts[i].item(), trade_mask[i], fills[i])
 
     return {
-        'final_action': final_action,
-        'trade_occurred': len(executed_trades) > 0,
+        'final_action': [ACTION_NAMES[code] for code in action_code],
         'executed_trades': executed_trades,
-        'ta_mode': ta_mode,
-        'fgi_score': fgi_score,
-        'multiplier': risk_multiplier,
-        'final_allocation_pct': allocation_pct
+        'history': history,
     }
-    
+
 
 # ==============================================================================
-# TELEGRAM ALERT FUNCTION (Reads from .json file)
+# TELEGRAM ALERT FUNCTION (Reads from environment variables)
 # ==============================================================================
-def send_telegram_message(message: str):
-    """Sends a message to the configured Telegram chat by reading credentials from config.json."""
-    
-   # ---  Read directly from environment variables ---
-    BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
-    CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID')
-    # -----------------------------------------------------------
+# ---  Read directly from environment variables (once, at startup) ---
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID')
+TELEGRAM_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+
+# Persistent HTTP session: keeps the TCP+TLS connection to api.telegram.org alive
+# between alerts instead of re-doing the handshake on every message. The adapter is
+# registered once with a pool sized for this bot: a single host, and at most a few
+# sends in flight (startup alert on the main thread, queued alerts from the notifier).
+_TG_SESSION = requests.Session()
+_TG_SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+
+TELEGRAM_MAX_MESSAGE_CHARS = 4096 # Telegram's limit for one sendMessage text
+
+
+def _split_telegram_text(lines: List[str], limit: int = TELEGRAM_MAX_MESSAGE_CHARS) -> List[str]:
+    """Joins lines with newlines into as few messages as fit under `limit` characters each."""
+    messages, current = [], ''
+    for line in lines:
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
+
+
+def send_telegram_message(lines: Union[str, List[str]]):
+    """
+    Sends one message to the configured Telegram chat using the credentials read at startup.
+    Accepts a single string or a list of lines, which are joined into one message (split
+    only if it exceeds Telegram's size limit). Sent as plain text, without parse_mode.
+    """
     
-    if not BOT_TOKEN or not CHAT_ID:
-        # NOTE: Using print() here is safe as this is run on the server
-        print("Telegram environment variables (TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID) not found. Skipping alert.")
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        logger.warning("Telegram environment variables (TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID) not found. Skipping alert.")
         return
 
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    payload = {
-        'chat_id': CHAT_ID,
-        'text': message,
-        'parse_mode': 'Markdown'
-    }
-    
-    try:
-        response = requests.post(url, data=payload, timeout=5)
-        response.raise_for_status() # Raise an exception for bad status codes
-        # print("Telegram message sent successfully.")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to send Telegram message: {e}")
+    if isinstance(lines, str):
+        lines = [lines]
+
+    for message in _split_telegram_text(lines):
+        payload = {
+            'chat_id': TELEGRAM_CHAT_ID,
+            'text': message,
+        }
+        
+        try:
+            response = _TG_SESSION.post(TELEGRAM_URL, data=payload, timeout=5)
+            response.raise_for_status() # Raise an exception for bad status codes
+            # logger.debug("Telegram message sent successfully.")
+        except requests.exceptions.RequestException as e:
+            logger.warning("Failed to send Telegram message: %s", e)
+
+
+async def telegram_notifier(queue: asyncio.Queue):
+    """
+    Background task that delivers queued alerts, so run_bot never waits on the Telegram
+    round-trip. The blocking POST runs in a worker thread, and every message that queued
+    up while the previous one was in flight goes out together as a single message.
+    """
+    while True:
+        messages = [await queue.get()]
+        while not queue.empty():
+            messages.append(queue.get_nowait())
+        try:
+            await asyncio.to_thread(send_telegram_message, messages)
+        finally:
+            for _ in messages:
+                queue.task_done()
 
 
 # ==============================================================================
 # 6. WEEKLY EMAIL REPORTING FUNCTION (Loads data from persisted files)
 # ==============================================================================
 
-def analyze_weekly_data() -> Tuple[dict, dict, float, float]:
+def analyze_weekly_data(cfg: Config = CFG) -> Tuple[Portfolio, dict, float, float]:
     """Loads and processes the portfolio state and trade logs for the report."""
-    global PORTFOLIO_STATE_FILE, TRADE_LOG_FILE, STARTING_BUDGET
     
     # 2.1 Load Portfolio State
-    portfolio = {}
     try:
-        with open(PORTFOLIO_STATE_FILE, 'r') as f:
-            portfolio = json.load(f)
+        portfolio = Portfolio.from_state(orjson.loads(Path(PORTFOLIO_STATE_FILE).read_bytes()))
     except Exception:
-        print("⚠️ Warning: Could not load portfolio state. Using initial defaults.")
-        portfolio = {'btc_qty': 0.0, 'total_value_usd': STARTING_BUDGET, 'cash': STARTING_BUDGET}
+        logger.warning("⚠️ Warning: Could not load portfolio state. Using initial defaults.")
+        portfolio = Portfolio(cash=cfg.starting_budget, total_value_usd=cfg.starting_budget)
 
     # 2.2 Analyze Trade Log
     weekly_summary = {
@@ -479,83 +639,121 @@ def analyze_weekly_data() -> Tuple[dict, dict, float, float]:
     }
     
     one_week_ago = datetime.now() - timedelta(days=7)
-    current_equity = portfolio.get('total_value_usd', STARTING_BUDGET)
+    current_equity = portfolio.total_value_usd
     
-    # To calculate P/L, we need the equity value exactly one week ago.
-    # We will approximate the previous week's equity using a simplified method.
-    # NOTE: In a professional setting, this requires saving a daily/weekly equity snapshot.
-    approx_previous_equity = STARTING_BUDGET # Using the initial budget as a simple baseline
+    # To calculate P/L, we need the equity value one week ago: use the persisted
+    # snapshot closest to that time (the starting budget only if no snapshot exists yet)
+    approx_previous_equity = cfg.starting_budget
+    try:
+        # Only the tail around one week ago is read (see _read_csv_rows_since)
+        snapshot_rows = _read_csv_rows_since(EQUITY_SNAPSHOT_FILE, one_week_ago)
+        if snapshot_rows:
+            snapshots = pd.read_csv(io.BytesIO(snapshot_rows), names=list(EQUITY_SNAPSHOT_COLUMNS),
+                                    parse_dates=['Timestamp'])
+            nearest = (snapshots['Timestamp'] - one_week_ago).abs().idxmin()
+            approx_previous_equity = float(snapshots.at[nearest, 'Equity'])
+    except FileNotFoundError:
+        logger.warning("⚠️ Warning: Equity snapshot file not found. Using the starting budget as P/L baseline.")
 
     try:
-        df_log = pd.read_csv(TRADE_LOG_FILE)
-        df_log['Date'] = pd.to_datetime(df_log['Date'])
-        
-        # Filter for the last week
-        df_week = df_log[df_log['Date'] >= one_week_ago].copy()
+        # Only the tail covering the last week is read (see _read_csv_rows_since);
+        # only the report's columns are parsed, then filtered to the week and summed per type
+        recent_rows = _read_csv_rows_since(TRADE_LOG_FILE, one_week_ago)
+        if not recent_rows:
+            return _weekly_result(portfolio, weekly_summary, current_equity, approx_previous_equity)
+
+        grp = (
+            pl.read_csv(recent_rows, has_header=False, new_columns=list(TRADE_LOG_COLUMNS),
+                        columns=[TRADE_LOG_COLUMNS.index(col) for col in TRADE_LOG_SCHEMA],
+                        schema_overrides=TRADE_LOG_SCHEMA)
+            .with_columns(pl.col('Date').str.strptime(pl.Datetime, '%Y-%m-%d %H:%M:%S'))
+            .filter(pl.col('Date') >= one_week_ago)
+            .group_by('Trade_Type')
+            .agg(pl.len().alias('count'), pl.col('Fees').sum().alias('fees'))
+        )
         
-        if not df_week.empty:
-            weekly_summary['total_trades'] = len(df_week)
+        if grp.height > 0:
+            weekly_summary['total_trades'] = int(grp['count'].sum())
             # Log trades must be properly tagged in your execute functions (DCA, Swing)
-            weekly_summary['DCA'] = len(df_week[df_week['Trade_Type'] == 'DCA'])
-            weekly_summary['Swing'] = len(df_week[df_week['Trade_Type'].str.contains('Swing', case=False)]) # Covers Swing, SwingSL, SwingTP
-            weekly_summary['total_fees'] = df_week['Fees'].sum()
+            weekly_summary['DCA'] = int(grp.filter(pl.col('Trade_Type') == 'DCA')['count'].sum())
+            is_swing = pl.col('Trade_Type').is_in(SWING_TRADE_TYPES) # Covers Swing, SwingSL, SwingTP
+            weekly_summary['Swing'] = int(grp.filter(is_swing)['count'].sum())
+            weekly_summary['total_fees'] = float(grp['fees'].sum())
             
     except FileNotFoundError:
-        print("⚠️ Warning: Trade log file not found. Summary will be empty.")
+        logger.warning("⚠️ Warning: Trade log file not found. Summary will be empty.")
 
-    # 2.3 Calculate P/L this week (simplified)
+    return _weekly_result(portfolio, weekly_summary, current_equity, approx_previous_equity)
+
+
+def _weekly_result(portfolio: Portfolio, weekly_summary: dict, current_equity: float,
+                   approx_previous_equity: float) -> Tuple[Portfolio, dict, float, float]:
+    """Calculates the P/L this week and packs the analyze_weekly_data() result."""
     equity_change_usd = current_equity - approx_previous_equity
     equity_change_pct = (equity_change_usd / approx_previous_equity) * 100 if approx_previous_equity else 0
     
     return portfolio, weekly_summary, equity_change_usd, equity_change_pct
 
 
-def generate_report_content() -> Tuple[str, str]:
-    """Generates the subject and HTML body using analyzed data."""
-    
-    portfolio, summary, p_l_usd, p_l_pct = analyze_weekly_data()
-    
-    # Ensure P/L is positive/negative formatted
-    p_l_usd_str = f"{p_l_usd:+.2f}"
-    p_l_pct_str = f"{p_l_pct:+.2f}%"
-    
-    report_subject = f"Weekly Trading Bot Report - P/L: {p_l_usd_str} USD ({p_l_pct_str})"
-    
-    # Format the requested data for the email body
-    html_body = f"""\
+# Prebuilt once at import; only the values are substituted per report
+REPORT_HTML_TEMPLATE = string.Template("""\
     <html>
       <body>
         <h2>Weekly Trading Bot Performance Summary</h2>
         <p>Dear User,</p>
-        <p>This report covers the past week's activity and the current state of your portfolio as of {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.</p>
+        <p>This report covers the past week's activity and the current state of your portfolio as of $report_time.</p>
         
         <h3>Portfolio Snapshot:</h3>
         <ul>
-          <li><strong>Portfolio Value:</strong> ${portfolio['total_value_usd']:,.2f}</li>
-          <li><strong>Holdings:</strong> {portfolio['btc_qty']:.2f} BTC, ${portfolio['cash']:,.2f} Cash</li>
+          <li><strong>Portfolio Value:</strong> $$$total_value</li>
+          <li><strong>Holdings:</strong> $btc_qty BTC, $$$cash Cash</li>
         </ul>
         
         <h3>Weekly Metrics:</h3>
         <ul>
-          <li><strong>P/L this week:</strong> {p_l_pct_str}, ${p_l_usd_str}</li>
-          <li><strong>Total Trades:</strong> {summary['total_trades']} ({summary['DCA']} DCA, {summary['Swing']} swing </li>
-          <li><strong>Total Fees Paid:</strong> ${summary['total_fees']:.2f}</li>
+          <li><strong>P/L this week:</strong> $p_l_pct, $$$p_l_usd</li>
+          <li><strong>Total Trades:</strong> $total_trades ($dca_trades DCA, $swing_trades swing </li>
+          <li><strong>Total Fees Paid:</strong> $$$total_fees</li>
         </ul>
         
         <p>This confirms the bot is running on AWS. The next report will be sent next Monday at 9:00 AM.</p>
         <p>Best regards,<br>The Bot.</p>
       </body>
     </html>
-    """
+    """)
+
+
+def generate_report_content() -> Tuple[str, str]:
+    """Generates the subject and HTML body using analyzed data."""
+    
+    portfolio, summary, p_l_usd, p_l_pct = analyze_weekly_data()
+    
+    # Ensure P/L is positive/negative formatted
+    p_l_usd_str = f"{p_l_usd:+.2f}"
+    p_l_pct_str = f"{p_l_pct:+.2f}%"
+    
+    report_subject = f"Weekly Trading Bot Report - P/L: {p_l_usd_str} USD ({p_l_pct_str})"
+    
+    # Format the requested data for the email body
+    html_body = REPORT_HTML_TEMPLATE.substitute(
+        report_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        total_value=f"{portfolio.total_value_usd:,.2f}",
+        btc_qty=f"{portfolio.btc_qty:.2f}",
+        cash=f"{portfolio.cash:,.2f}",
+        p_l_pct=p_l_pct_str,
+        p_l_usd=p_l_usd_str,
+        total_trades=summary['total_trades'],
+        dca_trades=summary['DCA'],
+        swing_trades=summary['Swing'],
+        total_fees=f"{summary['total_fees']:.2f}",
+    )
     return report_subject, html_body
 
 
 def send_weekly_email_report():
     """Sends the report email using Gmail's SMTP server."""
-    global EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECIPIENT, SMTP_SERVER, SMTP_PORT
-    
     if not EMAIL_SENDER or not EMAIL_PASSWORD:
-        print("❌ Email credentials (GMAIL_USER/GMAIL_PASS) not set or empty. Cannot send email.")
+        logger.error("❌ Email credentials (GMAIL_USER/GMAIL_PASS) not set or empty. Cannot send email.")
         return
 
     subject, body = generate_report_content()
@@ -572,10 +770,10 @@ def send_weekly_email_report():
             server.login(EMAIL_SENDER, EMAIL_PASSWORD) # Login with App Password
             server.send_message(msg)
         
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Weekly report successfully sent to {EMAIL_RECIPIENT}!")
+        logger.info("✅ Weekly report successfully sent to %s!", EMAIL_RECIPIENT)
 
     except Exception as e:
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ FATAL Error sending email: {e}")
+        logger.error("❌ FATAL Error sending email: %s", e)
 
 
 
@@ -584,140 +782,206 @@ def send_weekly_email_report():
 # ==============================================================================
 
 # Initialize portfolio (must be done only once, outside the loop) 
-portfolio = { 
-    'cash': STARTING_BUDGET, 
-    'btc_qty': 0.0, 
-    'swing_qty': 0.0, 
-    'swing_entry_price': 0.0, 
-    'stop_loss_level': 0.0, 
-    'total_value_usd': STARTING_BUDGET, 
-    'prev_week_equity': STARTING_BUDGET, # <--- NEW: Initial value for P/L baseline 
-    'last_report_date': None, # <--- NEW: Initial value for report date 
-    'last_processed_date': datetime(2023, 1, 1) # <--- NEW: Tracks the last day we traded! (Use history start date) 
-    }
+portfolio = Portfolio()
 
 
 # --- Check for persisted state on startup ---
-try:
-    with open(PORTFOLIO_STATE_FILE, 'r') as f:
-        loaded_portfolio = json.load(f)
-        # Only load keys that are expected to be present to prevent errors
-        for key in portfolio:
-            if key in loaded_portfolio:
-                portfolio[key] = loaded_portfolio[key]
-        
-        # <--- UPDATE: Convert dates back from string if they were loaded as strings
-        if isinstance(portfolio.get('last_report_date'), str):
-             portfolio['last_report_date'] = datetime.strptime(portfolio['last_report_date'], '%Y-%m-%d %H:%M:%S')
-        
-        if isinstance(portfolio.get('last_processed_date'), str): # <--- NEW: Convert processed date back to datetime
-             portfolio['last_processed_date'] = datetime.strptime(portfolio['last_processed_date'], '%Y-%m-%d %H:%M:%S')
-
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 💾 Portfolio state loaded from {PORTFOLIO_STATE_FILE}.")
-except FileNotFoundError:
-    # If file not found, use initial portfolio defined above and save it
+state_path = Path(PORTFOLIO_STATE_FILE)
+if not state_path.exists():
+    # No saved state yet: use the initial portfolio defined above and save it
     save_portfolio_state(portfolio)
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🆕 Initial portfolio created and saved.")
-except Exception as e:
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ Error loading portfolio state: {e}. Using default.")
+    logger.info("🆕 Initial portfolio created and saved.")
+else:
+    try:
+        # Only fields that Portfolio defines are loaded, to prevent errors
+        portfolio = Portfolio.from_state(orjson.loads(state_path.read_bytes()))
+        logger.info("💾 Portfolio state loaded from %s.", PORTFOLIO_STATE_FILE)
+    except Exception as e:
+        logger.error("❌ Error loading portfolio state: %s. Using default.", e)
 # --- END NEW CHECK ---
 
 
-def run_bot():
-    """Fetches data, runs strategy, reports, and waits."""
-    global CHECK_INTERVAL_SECONDS, portfolio
-    
-    while True:
+RETRY_BASE_SECONDS = 60            # First retry after a transient error
+RETRY_MAX_BACKOFF_SECONDS = 60 * 60 # Retries back off up to this (never past the next candle)
+SHUTDOWN_ALERT_TIMEOUT_SECONDS = 15 # How long a shutdown waits for queued alerts to go out
+
+
+def seconds_until_next_candle(interval_seconds: int, settle_seconds: float = 0) -> float:
+    """
+    Seconds until `settle_seconds` past the next multiple of `interval_seconds` since the
+    epoch (00:00 UTC for daily bars), i.e. until the next bar should be in the data file.
+    """
+    return interval_seconds - ((time.time() - settle_seconds) % interval_seconds)
+
+
+async def _wait_for_new_bar(new_bar: asyncio.Event, timeout: float) -> bool:
+    """Waits until `new_bar` is set or `timeout` elapses. Returns True if woken by the event."""
+    try:
+        await asyncio.wait_for(new_bar.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        return False
+    new_bar.clear()
+    return True
+
+
+async def run_bot(cfg: Config = CFG):
+    """
+    Fetches data, runs strategy, reports, and waits. Instead of a fixed sleep, the wait ends
+    at the next candle boundary or as soon as the data job signals a new bar (SIGUSR1),
+    e.g. `kill -USR1 <bot pid>` after it rewrites the CSV.
+    SIGTERM/SIGINT end the wait too: the bot finishes the current batch, saves its state,
+    delivers the queued alerts and returns.
+    """
+    check_interval_seconds = cfg.check_interval_seconds
+    bar_settle_seconds = cfg.bar_settle_seconds
+    consecutive_failures = 0 # Transient errors in a row; drives the retry backoff
+    validated_schema = None # Column layout of the last data that passed the REQUIRED_COLS check
+
+    new_bar = asyncio.Event()
+    shutdown = asyncio.Event()
+
+    def request_shutdown():
+        shutdown.set()
+        new_bar.set() # Wakes a pending wait right away
+
+    # Alerts are queued here and sent by telegram_notifier in the background
+    alerts = asyncio.Queue()
+    notifier_task = asyncio.create_task(telegram_notifier(alerts)) # Keep a reference so it is not collected
+    try:
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGUSR1, new_bar.set)
+        loop.add_signal_handler(signal.SIGTERM, request_shutdown)
+        loop.add_signal_handler(signal.SIGINT, request_shutdown)
+    except (NotImplementedError, AttributeError): # No SIGUSR1 / signal handlers on Windows
+        pass
+
+    while not shutdown.is_set():
+        # Wall-clock time of this tick, read once (log lines get theirs from the logging formatter)
+        tick_time = datetime.now()
+
         try:
             # 1. DATA ACQUISITION & PREP
             df = get_gsheet_data() 
             
             if df.empty:
-                time.sleep(CHECK_INTERVAL_SECONDS)
+                await _wait_for_new_bar(new_bar, seconds_until_next_candle(check_interval_seconds, bar_settle_seconds))
                 continue
 
             # CRITICAL CHECK: Ensure the DataFrame has the necessary TA columns
-            # The strategy logic relies on 'RSI', 'MACD', 'MACD_Signal', 'ATR', and 'FGI_Score'
-            required_cols = ['RSI', 'MACD', 'MACD_Signal', 'ATR', 'FGI_Score', 'Close']
-            if not all(col in df.columns for col in required_cols):
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🛑 Missing required TA columns. Ensure your GSheet preparation adds: {required_cols}. Waiting...")
-                time.sleep(CHECK_INTERVAL_SECONDS)
+            # The strategy logic relies on 'RSI', 'MACD', 'MACD_Signal', 'ATR', and 'FGI_Score'.
+            # Only re-validated when the column layout differs from the last one that passed.
+            schema = tuple(df.columns)
+            if schema != validated_schema and not REQUIRED_COLS.issubset(schema):
+                logger.error("🛑 Missing required TA columns. Ensure your GSheet preparation adds: %s. Waiting...", sorted(REQUIRED_COLS))
+                await _wait_for_new_bar(new_bar, seconds_until_next_candle(check_interval_seconds, bar_settle_seconds))
                 continue
+            validated_schema = schema
 
           # 🚀 NEW DYNAMIC LOOKBACK LOGIC (Now that data is validated) 🚀
-            # This logic runs immediately after validation to set the starting point
-            if not df.empty:
+            # This logic runs immediately after validation to set the starting point.
+            # Only a fresh portfolio (still at the sentinel date) starts from the last 7 days;
+            # afterwards the persisted last_processed_date is trusted, so bars are never re-run.
+            if portfolio.last_processed_date <= INITIAL_PROCESSED_DATE:
                 latest_data_date = df.index.max()
                 lookback_start_date = latest_data_date - timedelta(days=7)
-                portfolio['last_processed_date'] = lookback_start_date
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚙️ Set Lookback Date: {lookback_start_date.strftime('%Y-%m-%d')} (Last 7 days of data)")
+                portfolio.last_processed_date = lookback_start_date
+                logger.info("⚙️ Set Lookback Date: %s (Last 7 days of data)", lookback_start_date.date())
             # -------------------------------------------------------------
 
             # <--- NEW BATCH PROCESSING LOGIC
-            last_date = portfolio['last_processed_date']
+            last_date = portfolio.last_processed_date
             new_data_df = df[df.index > last_date]
-            trade_occurred_in_batch = False # Flag for batch Telegram alert
 
             if new_data_df.empty:
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 💤 No new data since {last_date.strftime('%Y-%m-%d')}. Waiting...")
-                time.sleep(CHECK_INTERVAL_SECONDS)
+                # The data job may simply be late: re-check soon rather than sleeping a whole candle
+                recheck_seconds = min(cfg.no_data_recheck_seconds,
+                                      seconds_until_next_candle(check_interval_seconds, bar_settle_seconds))
+                logger.info("💤 No new data since %s. Re-checking in %d minutes...", last_date.date(), recheck_seconds // 60)
+                await _wait_for_new_bar(new_bar, recheck_seconds)
                 continue
 
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚀 Processing {len(new_data_df)} new data points.")
-
-            for index, row in new_data_df.iterrows():
-
-                # 2. RUN STRATEGY AND EXECUTE
-                results = get_combined_signal_and_execute(row, portfolio)
-
-                 # Update the last processed date in the portfolio
-                portfolio['last_processed_date'] = index # Index is the datetime object for the day
-                
-                # Update equity for the day's close price and save state after each day is processed
-                current_btc_price = row['Close'] # Price from the historical data
-                current_equity = portfolio['cash'] + (portfolio['btc_qty'] * current_btc_price)
-                portfolio['total_value_usd'] = current_equity
-                save_portfolio_state(portfolio) # Save state after each day for recovery
-
-                if results['trade_occurred']:
-                    trade_occurred_in_batch = True
-
-                    # Format the list of trades into a readable string
-                    trade_list_str = "\n".join([f"- {trade_type}" for trade_type in results['executed_trades']])
-                    
-                    # Construct ONE detailed message containing ALL trades for this day
-                    trade_summary_msg = (
-                        f"🤖 *DAILY TRADES EXECUTED!* on {index.strftime('%Y-%m-%d')}\n"
-                        f"Executed Trade Events:\n{trade_list_str}\n" # <-- ALL trades in one message
-                        f"Final Action: **{results['final_action']}**\n"
-                        f"Equity: ${current_equity:.2f} | BTC: {portfolio['btc_qty']:.4f}"
+            logger.info("🚀 Processing %d new data points.", len(new_data_df))
+
+            # 2. RUN STRATEGY AND EXECUTE (vectorized signals, single stateful pass)
+            arrays, index_ts = to_strategy_arrays(new_data_df)
+            batch = run_strategy_batch(arrays, index_ts, portfolio)
+            trade_alerts = [] # One line per day with trades, sent as a single Telegram message
+
+            # Per-bar report values prepared column-wise (one strftime pass, plain floats)
+            bar_dates = new_data_df.index.strftime('%Y-%m-%d').tolist()
+            equity_values = batch['history']['equity'].tolist()
+            btc_values = batch['history']['btc_qty'].tolist()
+
+            log_bars = logger.isEnabledFor(logging.INFO) # Checked once, not once per bar
+
+            # One plain tuple per bar (like itertuples(name=None)), unpacked straight into locals
+            bar_rows = zip(bar_dates, batch['final_action'], batch['executed_trades'], equity_values, btc_values)
+            for bar_date, final_action, executed_trades, current_equity, btc_qty in bar_rows:
+
+                if executed_trades:
+                    # ONE line containing ALL trades for this day
+                    trade_alerts.append(
+                        f"- {bar_date}: {', '.join(executed_trades)} | "
+                        f"Final Action: {final_action} | "
+                        f"Equity: ${current_equity:.2f} | BTC: {btc_qty:.4f}"
                     )
-                    
-                    # 🚨 Call the Telegram function here for immediate, per-trade alert
-                    send_telegram_message(trade_summary_msg)
-                    # ----------------------------------------------------
 
-                print(f"  > [{index.strftime('%Y-%m-%d')}] Action: {results['final_action']} | Equity: ${current_equity:.2f}")
+                if log_bars:
+                    logger.info("  > [%s] Action: %s | Equity: $%.2f", bar_date, final_action, current_equity)
+
+            # Update the last processed date (equity was synced by run_strategy_batch), then
+            # save state for recovery (one write per batch: only the state after the last bar matters on restart)
+            portfolio.last_processed_date = new_data_df.index[-1] # Index is the datetime object for the day
+            save_portfolio_state(portfolio, durable=True)
+            log_equity_snapshot(tick_time, current_equity)
+            _flush_trades()
+            _flush_equity_snapshots()
+
+            # 🚨 One Telegram alert for the whole batch (a backfill no longer sends one per day)
+            if trade_alerts:
+                alerts.put_nowait("\n".join([f"🤖 DAILY TRADES EXECUTED! ({len(trade_alerts)} days)"] + trade_alerts))
             
             # 3. REPORTING & PERSISTENCE
-            status_message = (
-                f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] --- BATCH RESULT ---"
-                f"\n📈 Processed {len(new_data_df)} days. Final Action: *{results['final_action']}*"
-                f"\n💰 Final Equity: ${current_equity:.2f} | ₿ Total BTC Qty: {portfolio['btc_qty']:.4f}"
+            logger.info(
+                "--- BATCH RESULT ---"
+                "\n📈 Processed %d days. Final Action: *%s*"
+                "\n💰 Final Equity: $%.2f | ₿ Total BTC Qty: %.4f",
+                len(new_data_df), final_action, current_equity, portfolio.btc_qty,
             )
-            
-            print(status_message)
-            
-
-        except Exception as e:
-            error_msg = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]  UNHANDLED EXCEPTION in main loop: {e}"
-            print(error_msg)
+            consecutive_failures = 0
+
+        except TRANSIENT_ERRORS as e:
+            consecutive_failures += 1
+            backoff = min(RETRY_BASE_SECONDS * 2 ** (consecutive_failures - 1), RETRY_MAX_BACKOFF_SECONDS,
+                          seconds_until_next_candle(check_interval_seconds, bar_settle_seconds))
+            error_msg = f"[{tick_time:%Y-%m-%d %H:%M:%S}]  ERROR in main loop: {e}"
+            logger.error("ERROR in main loop (failure %d): %s. Retrying in %d seconds...", consecutive_failures, e, backoff)
             # Send critical error alert
-            send_telegram_message(f" CRITICAL ERROR ON AWS BOT:\n{error_msg}")
-        
-        # 4. WAIT
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]  Waiting {CHECK_INTERVAL_SECONDS // 60} minutes...")
-        time.sleep(CHECK_INTERVAL_SECONDS)
+            alerts.put_nowait(f" CRITICAL ERROR ON AWS BOT:\n{error_msg}")
+            await _wait_for_new_bar(new_bar, backoff)
+            continue
+        except Exception as e:
+            # Unknown error: alert right away (queued alerts die with the loop), then let it
+            # propagate so the process exits and the service manager restarts it cleanly
+            logger.exception("UNHANDLED EXCEPTION in main loop: %s", e)
+            error_msg = f"[{tick_time:%Y-%m-%d %H:%M:%S}]  UNHANDLED EXCEPTION in main loop: {e}"
+            await asyncio.to_thread(send_telegram_message, f" CRITICAL ERROR ON AWS BOT:\n{error_msg}")
+            raise
+
+        # 4. WAIT (until the next candle, or earlier if a new bar is signalled)
+        wait_seconds = seconds_until_next_candle(check_interval_seconds, bar_settle_seconds)
+        logger.info(" Waiting %d minutes...", wait_seconds // 60)
+        if await _wait_for_new_bar(new_bar, wait_seconds) and not shutdown.is_set():
+            logger.info("🔔 New bar signalled. Checking data...")
+
+    # 5. SHUTDOWN (trade/equity buffers are flushed by their atexit hooks)
+    logger.info("🛑 Shutdown requested. Saving state...")
+    save_portfolio_state(portfolio, durable=True)
+    try:
+        await asyncio.wait_for(alerts.join(), timeout=SHUTDOWN_ALERT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("⚠️ WARNING: %d queued alert(s) not delivered before shutdown.", alerts.qsize())
+    notifier_task.cancel()
 
  # ==============================================================================
 # SCRIPT ENTRY POINT
@@ -735,8 +999,13 @@ else:
     print("------------------------------------------")
     # This calls the loop function and starts the 24/7 operation
 
+    # Compile (or load the cached) strategy kernels before the first tick needs them
+    warmup_start = time.perf_counter()
+    warmup_kernels(STRATEGY_PARAMS)
+    logger.info("⚡ Strategy kernels ready in %.2fs.", time.perf_counter() - warmup_start)
+
     # Sends an immediate alert to confirm the main loop has successfully launched
-    send_telegram_message("✅ *BOT STARTUP SUCCESSFUL!* Main trading loop initialized and running.")
+    send_telegram_message("✅ BOT STARTUP SUCCESSFUL! Main trading loop initialized and running.")
     # ---------------------------
 
-    run_bot()
+    asyncio.run(run_bot())
@@ -0,0 +1,170 @@
+
+# ==============================================================================
+# Strategy kernel vs. the original rule-based strategy: compute_signals at every
+# threshold edge, and the stateful _run_batch pass over bars with NaN indicators
+# ==============================================================================
+
+import itertools
+
+import numpy as np
+import pytest
+
+from _strategy_loop import (
+    ACTION_NAMES, ACTION_AVOID_ENTRY, ACTION_HOLD_DCA_ONLY, HISTORY_DTYPE, N_STATE,
+    TRADE_SWING_SL, TRADE_SWING_TP, TRADE_DCA_BUY, TRADE_SWING_ENTRY,
+    FILL_SWING_EXIT, FILL_DCA_BUY, FILL_SWING_ENTRY,
+    _run_batch, compute_signals, make_params,
+)
+
+# Same values as the bot's configuration
+SWING_MAX = 0.60 # SWING_TRADE_ALLOCATION_MAX
+DCA_AMOUNT = 100.0
+COMMISSION = 0.002
+ATR_MULT = 3.0
+RSI_OVERSOLD = 30
+
+
+def reference_signal(rsi, macd_delta, fgi):
+    """The original branch-chain strategy (final_action, allocation_pct) for one bar."""
+    if macd_delta > 0 and rsi > 55:
+        ta_score = 2 # SWING_TRADE
+    elif rsi < 50 and rsi > 30 and abs(macd_delta) < 0.1:
+        ta_score = 1 # RANGE_BOUND
+    else:
+        ta_score = 0 # NEUTRAL
+
+    sentiment_score = 0
+    if fgi <= 24: sentiment_score = 2
+    elif fgi <= 49: sentiment_score = 1
+    elif fgi >= 75: sentiment_score = -1
+
+    combined_score = ta_score + sentiment_score
+    if combined_score >= 4:
+        final_action, base_allocation_pct = "AGGRESSIVE_BUY", SWING_MAX
+    elif combined_score >= 2:
+        final_action, base_allocation_pct = "MODERATE_BUY", SWING_MAX * 0.5
+    elif combined_score <= -1:
+        final_action, base_allocation_pct = "AVOID_ENTRY", 0.0
+    else:
+        final_action, base_allocation_pct = "HOLD_DCA_ONLY", 0.0
+
+    if 'BUY' not in final_action:
+        return final_action, base_allocation_pct
+
+    # Long-side rule-based multiplier
+    multiplier = 1.0
+    multiplier += 0.2 if macd_delta > 0 else -0.2
+    if fgi <= 30:
+        multiplier += 0.3
+    elif fgi >= 70:
+        multiplier -= 0.3
+    if rsi >= 75:
+        multiplier -= 0.1
+    elif rsi <= 30:
+        multiplier += 0.1
+    multiplier = max(0.0, min(1.5, multiplier))
+
+    allocation_pct = min(base_allocation_pct * multiplier, SWING_MAX)
+    if allocation_pct < SWING_MAX * 0.1:
+        final_action = f"RISK_BLOCKED_{final_action}"
+    return final_action, allocation_pct
+
+
+RSI_EDGES = [25, 30, 50, 55, 70, 75]
+FGI_EDGES = [24, 25, 30, 49, 50, 70, 74, 75]
+
+
+def _around(edges, step):
+    return sorted({edge + d for edge in edges for d in (-step, 0, step)})
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+@pytest.mark.parametrize('step', [1, 0.5])
+def test_compute_signals_matches_rules_at_edges(dtype, step):
+    rows = list(itertools.product(_around(RSI_EDGES, step), [-0.2, -0.05, 0.0, 0.05, 0.2],
+                                  _around(FGI_EDGES, step) + [np.nan]))
+    rsi, macd_delta, fgi = (np.array(col, dtype=dtype) for col in zip(*rows))
+
+    action_code, allocation_pct = compute_signals(
+        rsi, macd_delta, np.zeros_like(macd_delta), fgi, SWING_MAX)
+
+    for i, row in enumerate(zip(rsi.tolist(), macd_delta.tolist(), fgi.tolist())):
+        final_action, expected_allocation = reference_signal(*row)
+        assert ACTION_NAMES[action_code[i]] == final_action, row
+        assert allocation_pct[i] == pytest.approx(expected_allocation), row
+
+
+def reference_execute(close, rsi, atr, action_code, allocation_pct, portfolio):
+    """The original exit / DCA / entry functions for one bar. Returns (trade_mask, fills)."""
+    trade_mask = 0
+    fills = np.zeros((3, 3))
+
+    # A. Exits (close_tactical_trade)
+    if portfolio['swing_qty'] != 0.0:
+        exit_price = None
+        if close < portfolio['stop_loss']:
+            exit_price, trade_mask = portfolio['stop_loss'], TRADE_SWING_SL
+        elif close >= portfolio['swing_entry'] * 1.05:
+            exit_price, trade_mask = close, TRADE_SWING_TP
+        if exit_price is not None:
+            sale_usd = portfolio['swing_qty'] * exit_price
+            commission = sale_usd * COMMISSION
+            portfolio['cash'] += sale_usd - commission
+            portfolio['btc_qty'] -= portfolio['swing_qty']
+            fills[FILL_SWING_EXIT] = portfolio['swing_qty'], exit_price, commission
+            portfolio.update(swing_qty=0.0, swing_entry=0.0, stop_loss=0.0)
+
+    # B. DCA Buy (execute_dca_buy)
+    dca_amount = DCA_AMOUNT * 1.5 if rsi < RSI_OVERSOLD else DCA_AMOUNT
+    if portfolio['cash'] >= dca_amount:
+        commission = dca_amount * COMMISSION
+        buy_qty = (dca_amount - commission) / close
+        portfolio['cash'] -= dca_amount
+        portfolio['btc_qty'] += buy_qty
+        fills[FILL_DCA_BUY] = buy_qty, close, commission
+        trade_mask |= TRADE_DCA_BUY
+
+    # C. Tactical Entry (open_tactical_trade)
+    is_buy = action_code not in (ACTION_HOLD_DCA_ONLY, ACTION_AVOID_ENTRY)
+    if is_buy and portfolio['swing_qty'] == 0.0 and allocation_pct > 0:
+        trade_budget = portfolio['cash'] * allocation_pct
+        if trade_budget > 0:
+            commission = trade_budget * COMMISSION
+            buy_qty = (trade_budget - commission) / close
+            portfolio['cash'] -= trade_budget
+            portfolio['btc_qty'] += buy_qty
+            portfolio.update(swing_qty=buy_qty, swing_entry=close, stop_loss=close - atr * ATR_MULT)
+            fills[FILL_SWING_ENTRY] = buy_qty, close, commission
+            trade_mask |= TRADE_SWING_ENTRY
+
+    return trade_mask, fills
+
+
+def test_run_batch_matches_rules_with_nan_warmup_rows():
+    rng = np.random.default_rng(7)
+    n = 200
+    close = 30000.0 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))
+    rsi = rng.uniform(15, 85, n)
+    macd = rng.normal(0, 0.3, n)
+    fgi = rng.uniform(0, 100, n)
+    atr = close * rng.uniform(0.01, 0.05, n)
+    # Indicator warm-up rows, plus scattered gaps, have no ATR/RSI yet
+    rsi[:14] = atr[:14] = np.nan
+    atr[rng.choice(np.arange(14, n), 20, replace=False)] = np.nan
+
+    action_code, allocation_pct = compute_signals(rsi, macd, np.zeros(n), fgi, SWING_MAX)
+    params = make_params(DCA_AMOUNT, COMMISSION, ATR_MULT, RSI_OVERSOLD, SWING_MAX)
+    state = np.zeros(N_STATE)
+    state[0] = 100000.0
+    trade_mask, fills = _run_batch(close, rsi, atr, action_code, allocation_pct, state, params,
+                                   np.zeros(n, dtype=HISTORY_DTYPE))
+
+    portfolio = dict(cash=100000.0, btc_qty=0.0, swing_qty=0.0, swing_entry=0.0, stop_loss=0.0)
+    for i in range(n):
+        expected_mask, expected_fills = reference_execute(
+            close[i], rsi[i], atr[i], action_code[i], allocation_pct[i], portfolio)
+        assert trade_mask[i] == expected_mask, i
+        np.testing.assert_allclose(fills[i], expected_fills, rtol=1e-12, err_msg=str(i))
+
+    expected_state = [portfolio[k] for k in ('cash', 'btc_qty', 'swing_qty', 'swing_entry', 'stop_loss')]
+    np.testing.assert_allclose(state, expected_state, rtol=1e-12)